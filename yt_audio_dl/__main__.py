@@ -1,41 +1,56 @@
 """CLI entry point: python3 -m yt_audio_dl <playlist-url>."""
 
 import argparse
-import json
+import os
 import re
 import shutil
 import sys
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext, suppress
+from dataclasses import dataclass
 from datetime import datetime, timezone
 from pathlib import Path
 
+import orjson
+
+from .cache import ExtractionCache
 from .downloader import (
     DownloadResult,
+    PlaylistInfo,
     download_playlist,
     extract_playlist_info,
-    load_info_json,
 )
 from .metadata import (
+    batch_embed,
     clean_title,
     determine_album_artist,
-    embed_metadata,
     get_artist,
 )
 from .quodlibet import register_album
 
+_ILLEGAL_CHARS = re.compile(r'[<>:"/\\|?*]')
+_WHITESPACE = re.compile(r"\s+")
+
 
 def sanitize_filename(name: str) -> str:
     """Strip illegal characters and collapse whitespace."""
-    name = re.sub(r'[<>:"/\\|?*]', "", name)
-    name = re.sub(r"\s+", " ", name).strip()
+    name = _ILLEGAL_CHARS.sub("", name)
+    name = _WHITESPACE.sub(" ", name).strip()
     return name[:200]
 
 
 def check_dependencies() -> None:
     """Verify required external tools are available."""
-    missing = []
-    for cmd in ("yt-dlp", "ffmpeg"):
-        if not shutil.which(cmd):
-            missing.append(cmd)
+    # One walk over PATH finds both tools instead of a shutil.which per tool
+    needed = {"yt-dlp", "ffmpeg"}
+    for directory in os.environ.get("PATH", os.defpath).split(os.pathsep):
+        for cmd in list(needed):
+            path = os.path.join(directory, cmd)
+            if os.path.isfile(path) and os.access(path, os.X_OK):
+                needed.discard(cmd)
+        if not needed:
+            break
+    missing = sorted(needed)
     if missing:
         print(f"Error: missing required tools: {', '.join(missing)}", file=sys.stderr)
         print("Install with: sudo apt install -y yt-dlp ffmpeg", file=sys.stderr)
@@ -67,6 +82,11 @@ def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
         action="store_true",
         help="Skip Quod Libet integration",
     )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Download every track, even ones kept from an earlier run",
+    )
     parser.add_argument(
         "-v",
         "--verbose",
@@ -76,96 +96,219 @@ def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
     return parser.parse_args(argv)
 
 
-def dry_run(url: str, verbose: bool = False) -> None:
+def dry_run(
+    url: str,
+    verbose: bool = False,
+    cache: ExtractionCache | None = None,
+) -> None:
     """Print playlist info without downloading."""
-    info = extract_playlist_info(url, verbose=verbose)
+    info = extract_playlist_info(url, verbose=verbose, cache=cache)
     print(f"\nPlaylist: {info.title}")
     print(f"Tracks:   {info.track_count}")
     if info.uploader:
         print(f"Uploader: {info.uploader}")
     print()
-    for i, entry in enumerate(info.entries, 1):
+    for i, entry in enumerate(info.iter_entries(), 1):
         duration = entry.get("duration")
         dur_str = f" [{duration // 60}:{duration % 60:02d}]" if duration else ""
         print(f"  {i:3d}. {entry['title']}{dur_str}")
     print()
 
 
+@dataclass
+class PreparedTrack:
+    """A downloaded track with everything needed to tag and file it."""
+
+    opus_file: Path
+    info: dict
+    track_number: int
+    title: str
+    artist: str
+    dest_name: str
+
+
+def _move_track(track: PreparedTrack, album_dir: Path, same_fs: bool) -> dict:
+    """Move a tagged track into the album directory and return its log entry."""
+    dest_path = album_dir / track.dest_name
+
+    if same_fs:
+        os.replace(track.opus_file, dest_path)
+    else:
+        shutil.move(str(track.opus_file), str(dest_path))
+
+    return {
+        "track_number": track.track_number,
+        "video_id": track.info.get("id", ""),
+        "title": track.title,
+        "artist": track.artist,
+        "filename": track.dest_name,
+        "duration": track.info.get("duration"),
+    }
+
+
+def _prepare_track(
+    opus_file: Path, info: dict, track_number: int, artist_override: str | None
+) -> PreparedTrack:
+    """Clean the title, resolve the artist and build the file name of a track."""
+    title = clean_title(info.get("title", opus_file.stem))
+    return PreparedTrack(
+        opus_file=opus_file,
+        info=info,
+        track_number=track_number,
+        title=title,
+        artist=artist_override or get_artist(info),
+        dest_name=f"{track_number:02d} - {sanitize_filename(title)}.opus",
+    )
+
+
+def find_kept_tracks(
+    cache: ExtractionCache,
+    playlist_info: PlaylistInfo,
+    output_dir: Path,
+    album_name: str,
+    artist_override: str | None,
+) -> dict[str, tuple[Path, dict]]:
+    """Return the playlist's tracks already filed under this album on an earlier run.
+
+    Only files in an ``<output_dir>/<artist>/<album_name>`` directory count,
+    so changing the output dir or album name, or sharing a video with
+    another playlist, downloads the track again. Each kept track's info
+    gets its current playlist position.
+    """
+    positions = {
+        entry["id"]: i
+        for i, entry in enumerate(playlist_info.entries, 1)
+        if entry["id"]
+    }
+    base_dir = output_dir.resolve()
+    safe_album = sanitize_filename(album_name)
+    safe_artist = sanitize_filename(artist_override) if artist_override else None
+
+    kept_files = {}
+    for video_id, opus_file in cache.get_existing_files(list(positions)).items():
+        opus_file = opus_file.resolve()
+        album_dir = opus_file.parent
+        if album_dir.name != safe_album or album_dir.parent.parent != base_dir:
+            continue
+        if safe_artist is not None and album_dir.parent.name != safe_artist:
+            continue
+        kept_files[video_id] = opus_file
+
+    infos = cache.get_infos(list(kept_files))
+    return {
+        video_id: (
+            opus_file,
+            {**infos[video_id], "playlist_index": positions[video_id]},
+        )
+        for video_id, opus_file in kept_files.items()
+        if video_id in infos
+    }
+
+
+def _remove_if_emptied(album_dir: Path) -> None:
+    """Remove an earlier album directory whose tracks have all moved elsewhere."""
+    with suppress(OSError):
+        if [p.name for p in album_dir.iterdir()] == ["download_log.json"]:
+            (album_dir / "download_log.json").unlink()
+        album_dir.rmdir()
+        album_dir.parent.rmdir()
+
+
 def move_and_tag(
     result: DownloadResult,
     output_dir: Path,
     album_override: str | None,
     artist_override: str | None,
+    cache: ExtractionCache | None = None,
+    kept: dict[str, tuple[Path, dict]] | None = None,
 ) -> Path:
-    """Embed metadata and move files to the final album directory."""
-    # Load all info.json files and pair with opus files
-    pairs: list[tuple[Path, dict]] = []
-    info_map: dict[str, dict] = {}
-
-    for info_path in result.info_json_files:
-        info = load_info_json(info_path)
-        # Key is the stem without .info suffix
-        stem = info_path.name.removesuffix(".info.json")
-        info_map[stem] = info
-
-    for opus_file in result.downloaded_files:
-        stem = opus_file.stem
-        info = info_map.get(stem, {})
-        pairs.append((opus_file, info))
-
-    if not pairs:
+    """Embed metadata and move files to the final album directory.
+
+    Tracks are numbered 1..N in playlist order. Files ``kept`` from an
+    earlier run are re-tagged and moved along with the new downloads, so
+    the whole album shares one directory and album artist.
+    """
+    kept = kept or {}
+
+    # Stage kept tracks next to the new downloads under unique temp names
+    # first, so no move into the album can overwrite a file not yet moved
+    kept_dirs = {opus_file.parent for opus_file, _ in kept.values()}
+    opus_files = list(result.downloaded_files)
+    infos = dict(result.infos)
+    for video_id, (opus_file, info) in kept.items():
+        staged = result.temp_dir / f"{info['playlist_index']:03d} - {video_id}.opus"
+        shutil.move(opus_file, staged)
+        opus_files.append(staged)
+        infos[video_id] = info
+
+    # Merge new downloads and kept tracks in playlist order. Temp files are
+    # named "<playlist index> - <id>".
+    sources = []
+    for opus_file in opus_files:
+        index, _, video_id = opus_file.stem.partition(" - ")
+        sources.append((int(index), opus_file, infos.get(video_id, {})))
+    sources.sort(key=lambda source: source[0])
+
+    # Single pass: clean titles, resolve artists and build file names. Tracks
+    # are numbered consecutively, so videos that weren't filed leave no gaps.
+    tracks = [
+        _prepare_track(opus_file, info, track_number, artist_override)
+        for track_number, (_, opus_file, info) in enumerate(sources, 1)
+    ]
+
+    if not tracks:
         print("No tracks were downloaded.", file=sys.stderr)
         sys.exit(1)
 
     # Determine album metadata
-    all_infos = [info for _, info in pairs]
     album_name = album_override or result.playlist_info.title
-    album_artist = (
-        artist_override
-        if artist_override
-        else determine_album_artist(all_infos)
-    )
+    album_artist = artist_override or determine_album_artist(t.artist for t in tracks)
 
     # Build destination directory
     safe_artist = sanitize_filename(album_artist)
     safe_album = sanitize_filename(album_name)
-    album_dir = output_dir / safe_artist / safe_album
+    album_dir = output_dir.resolve() / safe_artist / safe_album
     album_dir.mkdir(parents=True, exist_ok=True)
 
-    log_entries = []
-
-    for i, (opus_file, info) in enumerate(pairs, 1):
-        # Tag the file
-        embed_metadata(
-            opus_file=opus_file,
-            info=info,
-            album=album_name,
-            track_number=i,
-            total_tracks=len(pairs),
-            album_artist=album_artist,
-            artist_override=artist_override,
-        )
+    batch_embed(
+        [(t.opus_file, t.info, t.track_number, t.title, t.artist) for t in tracks],
+        album=album_name,
+        total_tracks=len(tracks),
+        album_artist=album_artist,
+    )
 
-        # Build clean filename
-        title = clean_title(info.get("title", opus_file.stem))
-        safe_title = sanitize_filename(title)
-        dest_name = f"{i:02d} - {safe_title}.opus"
-        dest_path = album_dir / dest_name
-
-        shutil.move(str(opus_file), str(dest_path))
-
-        log_entries.append(
-            {
-                "track_number": i,
-                "video_id": info.get("id", ""),
-                "title": title,
-                "artist": artist_override or get_artist(info),
-                "filename": dest_name,
-                "duration": info.get("duration"),
-            }
+    # A plain rename is enough when the temp dir shares the album's filesystem
+    same_fs = os.stat(result.temp_dir).st_dev == os.stat(album_dir).st_dev
+
+    # Moves are I/O-bound, so threads overlap the disk work
+    with ThreadPoolExecutor(max_workers=min(8, len(tracks))) as pool:
+        futures = [
+            pool.submit(
+                _move_track,
+                track,
+                album_dir=album_dir,
+                same_fs=same_fs,
+            )
+            for track in tracks
+        ]
+        log_entries = [future.result() for future in futures]
+
+    # Kept tracks may have come from an album dir under another artist
+    for kept_dir in kept_dirs - {album_dir}:
+        _remove_if_emptied(kept_dir)
+
+    if cache is not None:
+        cache.store(
+            [
+                (t.info["id"], t.info, album_dir / t.dest_name)
+                for t in tracks
+                if t.info.get("id")
+            ]
         )
 
-        print(f"  {dest_name}")
+    log_entries.sort(key=lambda entry: entry["track_number"])
+    for entry in log_entries:
+        print(f"  {entry['filename']}")
 
     # Write download log
     log = {
@@ -175,11 +318,11 @@ def move_and_tag(
         "album_artist": album_artist,
         "download_date": datetime.now(timezone.utc).isoformat(),
         "tracks": log_entries,
+        "skipped": list(kept),
         "errors": result.errors,
     }
     log_path = album_dir / "download_log.json"
-    with open(log_path, "w") as f:
-        json.dump(log, f, indent=2)
+    log_path.write_bytes(orjson.dumps(log, option=orjson.OPT_INDENT_2))
 
     return album_dir
 
@@ -188,29 +331,61 @@ def main(argv: list[str] | None = None) -> None:
     args = parse_args(argv)
     check_dependencies()
 
-    if args.dry_run:
-        dry_run(args.url, verbose=args.verbose)
-        return
-
-    print(f"Extracting playlist info...")
-    result = download_playlist(args.url, verbose=args.verbose)
+    with nullcontext() if args.no_cache else ExtractionCache() as cache:
+        if args.dry_run:
+            dry_run(args.url, verbose=args.verbose, cache=cache)
+            return
 
-    print(
-        f"\nDownloaded {len(result.downloaded_files)} tracks "
-        f"from '{result.playlist_info.title}'"
-    )
-
-    if not result.downloaded_files:
-        print("No tracks downloaded.", file=sys.stderr)
-        sys.exit(1)
+        print(f"Extracting playlist info...")
+        playlist_info = extract_playlist_info(
+            args.url, verbose=args.verbose, cache=cache
+        )
+        kept = {}
+        if cache is not None:
+            kept = find_kept_tracks(
+                cache,
+                playlist_info,
+                output_dir=args.output_dir,
+                album_name=args.album_name or playlist_info.title,
+                artist_override=args.artist_name,
+            )
+
+        result = download_playlist(
+            args.url,
+            output_dir=args.output_dir,
+            verbose=args.verbose,
+            playlist_info=playlist_info,
+            skip=kept.keys(),
+        )
 
-    print("\nTagging and organizing files...")
-    album_dir = move_and_tag(
-        result,
-        output_dir=args.output_dir,
-        album_override=args.album_name,
-        artist_override=args.artist_name,
-    )
+        print(
+            f"\nDownloaded {len(result.downloaded_files)} tracks "
+            f"from '{result.playlist_info.title}'"
+        )
+        if kept:
+            print(f"Kept {len(kept)} tracks from an earlier run")
+
+        if not result.downloaded_files and not kept:
+            shutil.rmtree(result.temp_dir, ignore_errors=True)
+            print("No tracks downloaded.", file=sys.stderr)
+            sys.exit(1)
+
+        print("\nTagging and organizing files...")
+        try:
+            album_dir = move_and_tag(
+                result,
+                output_dir=args.output_dir,
+                album_override=args.album_name,
+                artist_override=args.artist_name,
+                cache=cache,
+                kept=kept,
+            )
+        except BaseException:
+            # Tracks that didn't make it into the album are still in there
+            print(f"Downloaded files kept in: {result.temp_dir}", file=sys.stderr)
+            raise
+        # The temp dir lives inside the output dir, so don't leave it behind
+        shutil.rmtree(result.temp_dir, ignore_errors=True)
 
     print(f"\nAlbum saved to: {album_dir}")
 
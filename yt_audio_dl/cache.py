@@ -0,0 +1,82 @@
+"""SQLite cache of processed videos, so repeat runs skip known playlist entries."""
+
+import sqlite3
+import time
+from pathlib import Path
+
+import orjson
+
+CACHE_PATH = Path.home() / ".cache" / "yt-audio-dl" / "cache.db"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache (
+    video_id TEXT PRIMARY KEY,
+    info_json BLOB,
+    opus_path TEXT,
+    mtime INTEGER
+)
+"""
+
+# Stay well below SQLite's limit on bound parameters per statement
+_BATCH_SIZE = 500
+
+
+class ExtractionCache:
+    """Maps video IDs to their info.json data and final Opus file."""
+
+    def __init__(self, path: Path = CACHE_PATH) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(_SCHEMA)
+
+    def __enter__(self) -> "ExtractionCache":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def _select(self, column: str, video_ids: list[str]) -> list[tuple]:
+        rows = []
+        for start in range(0, len(video_ids), _BATCH_SIZE):
+            batch = video_ids[start : start + _BATCH_SIZE]
+            placeholders = ",".join("?" * len(batch))
+            rows.extend(
+                self._conn.execute(
+                    f"SELECT video_id, {column} FROM cache "
+                    f"WHERE video_id IN ({placeholders})",
+                    batch,
+                )
+            )
+        return rows
+
+    def get_infos(self, video_ids: list[str]) -> dict[str, dict]:
+        """Return cached info.json data for the given video IDs."""
+        return {
+            video_id: orjson.loads(info_json)
+            for video_id, info_json in self._select("info_json", video_ids)
+            if info_json
+        }
+
+    def get_existing_files(self, video_ids: list[str]) -> dict[str, Path]:
+        """Return the Opus files of the given video IDs that are still on disk."""
+        files = {}
+        for video_id, opus_path in self._select("opus_path", video_ids):
+            if opus_path and Path(opus_path).exists():
+                files[video_id] = Path(opus_path)
+        return files
+
+    def store(self, tracks: list[tuple[str, dict, Path]]) -> None:
+        """Record processed videos as (video_id, info, opus_path) in one transaction."""
+        now = int(time.time())
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?)",
+                [
+                    (video_id, orjson.dumps(info), str(opus_path), now)
+                    for video_id, info, opus_path in tracks
+                ],
+            )
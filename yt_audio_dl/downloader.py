@@ -1,13 +1,49 @@
 """Download audio from YouTube playlists using yt-dlp Python API."""
 
-import json
+import os
+import queue
 import re
+import shutil
 import tempfile
+import threading
+from collections.abc import Collection, Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass, field
+from itertools import chain, islice
 from pathlib import Path
 from urllib.parse import parse_qs, urlparse
 
 import yt_dlp
+from yt_dlp.postprocessor import PostProcessor, get_postprocessor
+
+from .cache import ExtractionCache
+
+# Run on each finished download in the background while the next one downloads.
+# No FFmpegMetadata: tags are written with mutagen after the download.
+_POSTPROCESSORS = [
+    {
+        "key": "FFmpegExtractAudio",
+        "preferredcodec": "opus",
+    },
+    {
+        "key": "EmbedThumbnail",
+    },
+]
+
+# Parallel YoutubeDL instances; each downloads its own share of the playlist
+_DOWNLOAD_WORKERS = 4
+
+# Finished downloads per worker allowed to wait for post-processing
+_PENDING_LIMIT = 2
+
+# Seconds between cancellation checks while waiting for room in the queue
+_PUT_TIMEOUT = 0.5
+
+# Fields kept from each flat playlist entry
+_ENTRY_KEYS = ("id", "title", "url", "duration", "uploader")
+
+# Entries looked up in the cache per query while streaming the playlist
+_CACHE_PAGE = 100
 
 
 def normalize_playlist_url(url: str) -> str:
@@ -22,15 +58,49 @@ def normalize_playlist_url(url: str) -> str:
 
 @dataclass
 class PlaylistInfo:
-    """Metadata extracted from a YouTube playlist."""
+    """Metadata extracted from a YouTube playlist.
+
+    Entries are produced lazily from ``entry_source``: ``iter_entries``
+    yields them as they arrive, ``entries`` materializes the full list.
+    """
 
     title: str
     url: str
-    entries: list[dict]
+    entry_source: Iterable[dict]
     uploader: str | None = None
+    playlist_count: int | None = None
+    _seen: list[dict] = field(default_factory=list, init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        self._pending = iter(self.entry_source)
+
+    def iter_entries(self) -> Iterator[dict]:
+        """Yield entries, pulling new ones from the source only as needed."""
+        i = 0
+        while True:
+            while i < len(self._seen):
+                yield self._seen[i]
+                i += 1
+            entry = next(self._pending, None)
+            if entry is None:
+                return
+            self._seen.append(entry)
+
+    @property
+    def entries(self) -> list[dict]:
+        for _ in self.iter_entries():
+            pass
+        return self._seen
 
     @property
     def track_count(self) -> int:
+        """Playlist size as reported up front, for display only.
+
+        yt-dlp's count can include hidden or unavailable videos, so use
+        ``len(entries)`` wherever the exact number matters.
+        """
+        if self.playlist_count is not None:
+            return self.playlist_count
         return len(self.entries)
 
 
@@ -39,13 +109,71 @@ class DownloadResult:
     """Result of downloading a playlist."""
 
     playlist_info: PlaylistInfo
+    temp_dir: Path
     downloaded_files: list[Path] = field(default_factory=list)
-    info_json_files: list[Path] = field(default_factory=list)
+    infos: dict[str, dict] = field(default_factory=dict)
     errors: list[str] = field(default_factory=list)
 
 
-def extract_playlist_info(url: str, verbose: bool = False) -> PlaylistInfo:
-    """Extract playlist metadata without downloading."""
+def _iter_raw_entries(
+    ydl: yt_dlp.YoutubeDL, raw_entries: Iterable[dict | None]
+) -> Iterator[dict]:
+    """Yield the non-empty playlist entries, ending early if a page fails to load."""
+    entries = iter(raw_entries)
+    while True:
+        # Later pages are fetched inside next(), outside yt-dlp's error handling
+        try:
+            entry = next(entries)
+        except StopIteration:
+            return
+        except (yt_dlp.utils.DownloadError, yt_dlp.utils.ExtractorError) as e:
+            ydl.report_error(f"Stopped reading the playlist: {e}")
+            return
+        if entry:
+            yield entry
+
+
+def _project_entries(
+    ydl: yt_dlp.YoutubeDL,
+    raw_entries: Iterable[dict | None],
+    cache: ExtractionCache | None,
+) -> Iterator[dict]:
+    """Yield the fields we use from each playlist entry as yt-dlp produces it."""
+    try:
+        entries = (
+            {key: entry.get(key) for key in _ENTRY_KEYS}
+            for entry in _iter_raw_entries(ydl, raw_entries)
+        )
+        if cache is None:
+            yield from entries
+            return
+
+        # Fill gaps from the cache a page at a time, so output still streams
+        while page := list(islice(entries, _CACHE_PAGE)):
+            cached_infos = cache.get_infos([e["id"] for e in page if e["id"]])
+            for entry in page:
+                cached = cached_infos.get(entry["id"], {})
+                for key, value in entry.items():
+                    if value is None:
+                        entry[key] = cached.get(key)
+                yield entry
+    finally:
+        # The playlist's later pages are fetched through ydl
+        ydl.close()
+
+
+def extract_playlist_info(
+    url: str,
+    verbose: bool = False,
+    cache: ExtractionCache | None = None,
+) -> PlaylistInfo:
+    """Extract playlist metadata without downloading.
+
+    Entries are fetched lazily as the returned ``PlaylistInfo`` is iterated.
+    A URL of a single video yields that video as the only entry.
+    Fields missing from the flat playlist listing are filled in from
+    ``cache`` for videos processed on an earlier run.
+    """
     url = normalize_playlist_url(url)
     opts = {
         "extract_flat": "in_playlist",
@@ -53,92 +181,228 @@ def extract_playlist_info(url: str, verbose: bool = False) -> PlaylistInfo:
         "no_warnings": not verbose,
         "ignoreerrors": True,
     }
-    with yt_dlp.YoutubeDL(opts) as ydl:
-        info = ydl.extract_info(url, download=False)
-
-    if info is None:
-        raise RuntimeError("Failed to extract playlist info")
-
-    # Materialize lazy iterator
-    raw_entries = info.get("entries", []) or []
-    raw_entries = list(raw_entries)
-
-    entries = []
-    for entry in raw_entries:
-        if entry is not None:
-            entries.append(
-                {
-                    "id": entry.get("id"),
-                    "title": entry.get("title"),
-                    "url": entry.get("url"),
-                    "duration": entry.get("duration"),
-                    "uploader": entry.get("uploader"),
-                }
-            )
+    ydl = yt_dlp.YoutubeDL(opts)
+    try:
+        # Unprocessed results keep yt-dlp's lazy entry generator intact
+        info = ydl.extract_info(url, download=False, process=False)
+        if info is not None and info.get("_type") != "playlist":
+            info = ydl.process_ie_result(info, download=False)
+
+        if info is None:
+            raise RuntimeError("Failed to extract playlist info")
+
+        if info.get("_type", "video") == "video":
+            # A single video becomes a one-track album; its "url" is the media URL
+            raw_entries = [{**info, "url": info.get("webpage_url") or url}]
+        else:
+            raw_entries = info.get("entries", []) or []
+    except BaseException:
+        ydl.close()
+        raise
+
+    # Start the generator right away: from here on its finally closes ydl,
+    # even if the entries are never read and it's only garbage collected
+    entries = _project_entries(ydl, raw_entries, cache)
+    first = next(entries, None)
 
     return PlaylistInfo(
         title=info.get("title", "Unknown Playlist"),
         url=url,
-        entries=entries,
+        entry_source=[] if first is None else chain([first], entries),
         uploader=info.get("uploader"),
+        playlist_count=info.get("playlist_count"),
     )
 
 
+class _QueueForPostprocessing(PostProcessor):
+    """Hand each finished download to the background post-processing queue.
+
+    Registered to run after yt-dlp's own fixups and file moves, so the
+    queued file is final and nothing else touches it afterwards.
+    """
+
+    def __init__(
+        self,
+        downloader: yt_dlp.YoutubeDL,
+        pending: queue.Queue[tuple[str, dict] | None],
+        cancelled: threading.Event,
+    ) -> None:
+        super().__init__(downloader)
+        self._pending = pending
+        self._cancelled = cancelled
+
+    def run(self, info: dict) -> tuple[list[str], dict]:
+        # sanitize_info deep-copies, so the consumer shares nothing with yt-dlp
+        item = (info["filepath"], yt_dlp.YoutubeDL.sanitize_info(info))
+        # Don't wait forever on a full queue nobody will drain
+        while not self._cancelled.is_set():
+            try:
+                self._pending.put(item, timeout=_PUT_TIMEOUT)
+                return [], info
+            except queue.Full:
+                pass
+        raise yt_dlp.utils.DownloadCancelled()
+
+
+def _postprocess(ydl: yt_dlp.YoutubeDL, filename: str, info: dict) -> dict:
+    """Convert a downloaded file to Opus, embed its thumbnail and return its info."""
+    info = {**info, "filepath": filename}
+    for pp_def in _POSTPROCESSORS:
+        pp_def = dict(pp_def)
+        pp = get_postprocessor(pp_def.pop("key"))(ydl, **pp_def)
+        info = ydl.run_pp(pp, info)
+    return ydl.sanitize_info(info, remove_private_keys=True)
+
+
 def download_playlist(
     url: str,
     temp_dir: Path | None = None,
+    output_dir: Path | None = None,
     verbose: bool = False,
+    playlist_info: PlaylistInfo | None = None,
+    skip: Collection[str] = (),
 ) -> DownloadResult:
-    """Download all audio tracks from a playlist to a temp directory."""
+    """Download all audio tracks from a playlist to a temp directory.
+
+    The temp directory is created inside ``output_dir`` when given, so the
+    finished files can later be renamed into place instead of copied.
+    A temp directory created here is removed again if the download fails;
+    on success, removing it is up to the caller.
+    Entries whose video ID is in ``skip`` are not downloaded.
+    """
     url = normalize_playlist_url(url)
-    # First extract playlist info
-    playlist_info = extract_playlist_info(url, verbose=verbose)
+    # First extract playlist info, unless the caller already did
+    if playlist_info is None:
+        playlist_info = extract_playlist_info(url, verbose=verbose)
 
-    if temp_dir is None:
-        temp_dir = Path(tempfile.mkdtemp(prefix="yt-audio-dl-"))
+    created_temp_dir = temp_dir is None
+    if created_temp_dir:
+        if output_dir is not None:
+            output_dir.mkdir(parents=True, exist_ok=True)
+        temp_dir = Path(tempfile.mkdtemp(prefix=".yt-audio-dl-", dir=output_dir))
 
     temp_dir.mkdir(parents=True, exist_ok=True)
-    output_template = str(temp_dir / "%(playlist_index)03d - %(title)s.%(ext)s")
+    output_template = str(temp_dir / "%(playlist_index)03d - %(id)s.%(ext)s")
 
+    result = DownloadResult(playlist_info=playlist_info, temp_dir=temp_dir)
+
+    indexed = [
+        (i, entry)
+        for i, entry in enumerate(playlist_info.entries, 1)
+        if entry["id"] not in skip
+    ]
+
+    workers = max(1, min(_DOWNLOAD_WORKERS, len(indexed)))
+    pending: queue.Queue[tuple[str, dict] | None] = queue.Queue(
+        maxsize=_PENDING_LIMIT * workers
+    )
+
+    # Set on Ctrl-C or a failed worker to stop every download in flight
+    cancelled = threading.Event()
+
+    def on_progress(d: dict) -> None:
+        if cancelled.is_set():
+            raise yt_dlp.utils.DownloadCancelled()
+
+    # yt-dlp only downloads; ffmpeg runs on earlier files meanwhile
     opts = {
         "format": "bestaudio/best",
-        "postprocessors": [
-            {
-                "key": "FFmpegExtractAudio",
-                "preferredcodec": "opus",
-            },
-            {
-                "key": "FFmpegMetadata",
-            },
-            {
-                "key": "EmbedThumbnail",
-            },
-        ],
+        "postprocessors": [],
+        "progress_hooks": [on_progress],
+        "concurrent_fragment_downloads": 4,
         "writethumbnail": True,
-        "writeinfojson": True,
         "outtmpl": output_template,
         "ignoreerrors": True,
         "quiet": not verbose,
         "no_warnings": not verbose,
-        "noplaylist": False,
+        "noplaylist": True,
     }
 
-    result = DownloadResult(playlist_info=playlist_info)
+    def consume() -> None:
+        try:
+            with yt_dlp.YoutubeDL(opts) as ydl:
+                while (item := pending.get()) is not None:
+                    if cancelled.is_set():
+                        continue
+                    filename, info = item
+                    # Tagging still gets the download's info if post-processing
+                    # fails after the Opus file was written
+                    result.infos[info["id"]] = ydl.sanitize_info(
+                        info, remove_private_keys=True
+                    )
+                    try:
+                        info = _postprocess(ydl, filename, info)
+                        result.infos[info["id"]] = info
+                    except Exception as e:
+                        result.errors.append(f"{Path(filename).name}: {e}")
+        except BaseException:
+            cancelled.set()
+            raise
 
-    with yt_dlp.YoutubeDL(opts) as ydl:
-        ydl.download([url])
+    def download(chunk: list[tuple[int, dict]]) -> None:
+        # YoutubeDL instances are not thread-safe, so each worker gets its own
+        with yt_dlp.YoutubeDL(opts) as ydl:
+            ydl.add_post_processor(
+                _QueueForPostprocessing(ydl, pending, cancelled), when="after_move"
+            )
+            for index, entry in chunk:
+                if cancelled.is_set():
+                    return
+                # yt-dlp clears playlist_index on videos without a playlist
+                info = ydl.extract_info(
+                    entry["url"] or entry["id"],
+                    extra_info={
+                        "playlist": playlist_info.title,
+                        "playlist_index": index,
+                    },
+                )
+                if info is None:
+                    result.errors.append(f"{entry['title']}: download failed")
 
-    # Collect downloaded files
-    for path in sorted(temp_dir.iterdir()):
-        if path.suffix == ".opus":
-            result.downloaded_files.append(path)
-        elif path.suffix == ".json" and path.stem.endswith(".info"):
-            result.info_json_files.append(path)
+    def download_all() -> None:
+        chunks = [indexed[k::workers] for k in range(workers)]
 
-    return result
+        postprocessors = ThreadPoolExecutor(max_workers=workers)
+        downloaders = ThreadPoolExecutor(max_workers=workers)
+        consumers = [postprocessors.submit(consume) for _ in range(workers)]
+        try:
+            for future in [downloaders.submit(download, c) for c in chunks]:
+                future.result()
+        except yt_dlp.utils.DownloadCancelled:
+            # Only a failed consumer cancels downloads; its error is raised below
+            pass
+        except BaseException:
+            cancelled.set()
+            downloaders.shutdown(cancel_futures=True)
+            raise
+        finally:
+            downloaders.shutdown()
+            if cancelled.is_set():
+                # Consumers may be gone; make room for the sentinels
+                while True:
+                    try:
+                        pending.get_nowait()
+                    except queue.Empty:
+                        break
+            for _ in consumers:
+                pending.put(None)
+            postprocessors.shutdown()
+        for consumer in consumers:
+            consumer.result()
 
+    try:
+        download_all()
+    except BaseException:
+        # Don't leave a half-filled temp dir of our own in the output dir
+        if created_temp_dir:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+        raise
 
-def load_info_json(path: Path) -> dict:
-    """Load and return the contents of an info.json file."""
-    with open(path) as f:
-        return json.load(f)
+    # Collect downloaded files; DirEntry names need no extra Path objects
+    with os.scandir(temp_dir) as it:
+        dir_entries = sorted(it, key=lambda e: e.name)
+    for dir_entry in dir_entries:
+        if dir_entry.name.endswith(".opus") and dir_entry.is_file():
+            result.downloaded_files.append(Path(dir_entry.path))
+
+    return result
@@ -1,31 +1,38 @@
 """Embed metadata tags into downloaded Opus files using mutagen."""
 
 import re
+from collections.abc import Iterable
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+from mutagen import PaddingInfo
 from mutagen.oggopus import OggOpus
 
 
-# Patterns to strip from titles
+# Patterns to strip from titles. Alternatives sharing a prefix are merged,
+# trie-style, so a bracket that starts no noise phrase is rejected early.
 _TITLE_NOISE = re.compile(
     r"\s*[\(\[]\s*(?:"
     r"Official\s+(?:Video|Audio|Music\s+Video|Lyric\s+Video|Visualizer)"
     r"|Lyric\s+Video"
-    r"|Audio\s+Only"
-    r"|Audio"
-    r"|HQ"
-    r"|HD"
+    r"|Audio(?:\s+Only)?"
+    r"|H[QD]"
     r"|4K"
     r")\s*[\)\]]",
     re.IGNORECASE,
 )
+_EXTRA_SPACES = re.compile(r"\s{2,}")
 
 
 def clean_title(title: str) -> str:
     """Strip common YouTube noise from a track title."""
-    cleaned = _TITLE_NOISE.sub("", title)
+    # Every noise phrase is bracketed, so most titles skip the regex entirely
+    if "(" in title or "[" in title:
+        cleaned = _TITLE_NOISE.sub("", title)
+    else:
+        cleaned = title
     # Collapse multiple spaces
-    cleaned = re.sub(r"\s{2,}", " ", cleaned).strip()
+    cleaned = _EXTRA_SPACES.sub(" ", cleaned).strip()
     return cleaned or title
 
 
@@ -38,26 +45,25 @@ def get_artist(info: dict) -> str:
     return "Unknown Artist"
 
 
-def embed_metadata(
-    opus_file: Path,
+def _keep_padding(info: PaddingInfo) -> int:
+    """Reuse the existing padding so only the tag pages get rewritten."""
+    return info.padding if info.padding >= 0 else info.get_default_padding()
+
+
+def _set_tags(
+    audio: OggOpus,
     info: dict,
+    title: str,
+    artist: str,
     album: str,
     track_number: int,
     total_tracks: int,
     album_artist: str,
-    artist_override: str | None = None,
-    album_override: str | None = None,
 ) -> None:
-    """Write tags to an Opus file using mutagen."""
-    audio = OggOpus(opus_file)
-
-    title = clean_title(info.get("title", opus_file.stem))
-    artist = artist_override or get_artist(info)
-    album_name = album_override or album
-
+    """Fill in the tags of an opened Opus file without saving it."""
     audio["title"] = [title]
     audio["artist"] = [artist]
-    audio["album"] = [album_name]
+    audio["album"] = [album]
     audio["albumartist"] = [album_artist]
     audio["tracknumber"] = [str(track_number)]
     audio["tracktotal"] = [str(total_tracks)]
@@ -66,14 +72,47 @@ def embed_metadata(
     if upload_date and len(upload_date) >= 4:
         audio["date"] = [upload_date[:4]]
 
-    audio.save()
-
 
-def determine_album_artist(infos: list[dict]) -> str:
-    """Determine album artist: single artist if all same, else Various Artists."""
-    artists = set()
-    for info in infos:
-        artists.add(get_artist(info))
-    if len(artists) == 1:
-        return artists.pop()
-    return "Various Artists"
+def batch_embed(
+    tracks: list[tuple[Path, dict, int, str, str]],
+    album: str,
+    total_tracks: int,
+    album_artist: str,
+    max_workers: int = 8,
+) -> None:
+    """Tag a whole album: set all tags in memory, then save the files in parallel.
+
+    ``tracks`` holds (opus_file, info, track_number, title, artist) tuples,
+    with the title already cleaned and the artist already resolved.
+    """
+    files = []
+    for opus_file, info, track_number, title, artist in tracks:
+        audio = OggOpus(opus_file)
+        _set_tags(
+            audio,
+            info,
+            title=title,
+            artist=artist,
+            album=album,
+            track_number=track_number,
+            total_tracks=total_tracks,
+            album_artist=album_artist,
+        )
+        files.append(audio)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        list(pool.map(lambda audio: audio.save(padding=_keep_padding), files))
+
+
+def determine_album_artist(artists: Iterable[str]) -> str:
+    """Determine album artist: single artist if all same, else Various Artists.
+
+    Stops consuming ``artists`` at the second distinct name.
+    """
+    first = None
+    for artist in artists:
+        if first is None:
+            first = artist
+        elif artist != first:
+            return "Various Artists"
+    return first or "Various Artists"
@@ -1,13 +1,32 @@
 """Quod Libet integration: register downloaded albums with the music player."""
 
+import contextlib
 import shutil
 import subprocess
 import time
 from pathlib import Path
 
+_PROC = Path("/proc")
+
+# Library file of older (~/.quodlibet) and XDG-style Quod Libet installs
+_LIBRARY_FILES = (
+    Path.home() / ".quodlibet" / "songs",
+    Path.home() / ".config" / "quodlibet" / "songs",
+)
+_SCAN_TIMEOUT = 3.0
+_POLL_INTERVAL = 0.1
+
 
 def is_quodlibet_running() -> bool:
     """Check if Quod Libet is currently running."""
+    # On Linux, read process names directly instead of spawning pgrep
+    if _PROC.is_dir():
+        for comm in _PROC.glob("[0-9]*/comm"):
+            with contextlib.suppress(OSError):
+                if comm.read_text().strip() == "quodlibet":
+                    return True
+        return False
+
     try:
         result = subprocess.run(
             ["pgrep", "-x", "quodlibet"],
@@ -18,6 +37,23 @@ def is_quodlibet_running() -> bool:
         return False
 
 
+def _library_mtime() -> float | None:
+    """Return the mtime of Quod Libet's library file, if there is one."""
+    for path in _LIBRARY_FILES:
+        with contextlib.suppress(OSError):
+            return path.stat().st_mtime
+    return None
+
+
+def _wait_for_library_update(mtime_before: float | None) -> None:
+    """Poll the library file until it changes or the scan timeout expires."""
+    deadline = time.monotonic() + _SCAN_TIMEOUT
+    while time.monotonic() < deadline:
+        if _library_mtime() != mtime_before:
+            return
+        time.sleep(_POLL_INTERVAL)
+
+
 def register_album(album_dir: Path, skip: bool = False) -> None:
     """Register an album directory with Quod Libet."""
     if skip:
@@ -29,12 +65,13 @@ def register_album(album_dir: Path, skip: bool = False) -> None:
 
     if is_quodlibet_running():
         print("Registering album with Quod Libet...")
+        mtime_before = _library_mtime()
         subprocess.run(
             ["quodlibet", f"--add-location={album_dir}"],
             capture_output=True,
         )
         # Wait for the async library scan to finish before refreshing
-        time.sleep(3)
+        _wait_for_library_update(mtime_before)
         subprocess.run(
             ["quodlibet", "--refresh"],
             capture_output=True,